@@ -4,7 +4,12 @@
 import matplotlib
 matplotlib.use('Agg')  # Use non-interactive backend
 import matplotlib.pyplot as plt
-from src.pyigv import Alignment, plot_alignments
+import sys
+
+# import the package as `pyigv` (not `src.pyigv`) so numba's on-disk kernel
+# cache is shared with the tests and installed copies
+sys.path.insert(0, "src")
+from pyigv import Alignment, plot_alignments
 
 # Create example alignments
 target = "AAACCCGGGTTTATATATAT"
@@ -17,7 +22,7 @@ queries = [
 ]
 
 # Create alignments
-alignments = [Alignment(target, query) for query in queries]
+alignments = Alignment.from_batch(target, queries)
 
 # Generate plot
 fig = plot_alignments(alignments, title="Example Alignment Visualization", return_fig=True)
@@ -1,10 +1,21 @@
 __version__ = "0.1.4"  # bump this whenever you release a new version
 
-# import the two main exports from alignment.py
-from .alignment import Alignment, plot_alignments
+# import the main exports from alignment.py
+from .alignment import (
+    Alignment,
+    PlotData,
+    clear_plot_cache,
+    plot_alignments,
+    prepare_plot,
+    render_plot,
+)
 
 # make sure that `from pyigv import *` also pulls them in
 __all__ = [
     "Alignment",
     "plot_alignments",
+    "prepare_plot",
+    "render_plot",
+    "PlotData",
+    "clear_plot_cache",
 ]
@@ -0,0 +1,116 @@
+import numpy as np
+
+from numba import njit
+
+from ._codes import DELETION, GAP, INSERTION, MUTATION, SPACE
+
+
+@njit(cache=True, inline="always")
+def _classify(target_base, query_base):
+    if target_base == query_base:
+        return SPACE
+    if target_base == GAP:
+        return INSERTION
+    if query_base == GAP:
+        return DELETION
+    return MUTATION
+
+
+# Builds everything Alignment needs from the two gapped sequences in a single
+# left-to-right pass: the per-column symbols and edits (with adjacent
+# insertion/deletion runs merged into mismatches), the insertion, deletion and
+# mismatch counts, and the [start, length] of every insertion block in target
+# coordinates. Columns are consumed one run of equal edits at a time, so a
+# merge always sees the whole run; the previous run is always the last thing
+# written, which lets merges rewrite or drop its tail in place.
+@njit(cache=True)
+def build_alignment(target, query):
+    n = min(target.shape[0], query.shape[0])
+    # merging only ever drops columns, so the output fits in n columns and is
+    # truncated at the end instead of being copied into a right-sized buffer
+    buf = np.empty((2, n), np.uint8)
+    symbols = buf[0]
+    edits = buf[1]
+    # insertion blocks are separated by at least one other column
+    insertions = np.empty(((n + 1) // 2, 2), np.int64)
+    n_insertions = 0
+    insertion_ct = 0
+    deletion_ct = 0
+    mutation_ct = 0
+
+    k = 0  # write index
+    prev_type = SPACE
+    prev_length = 0  # columns of the previous run still available to merge
+    i = 0
+    edit = _classify(target[0], query[0]) if n > 0 else SPACE
+    while i < n:
+        # find the run [i, end) of equal edits
+        end = i + 1
+        next_edit = SPACE
+        while end < n:
+            next_edit = _classify(target[end], query[end])
+            if next_edit != edit:
+                break
+            end += 1
+        length = end - i
+
+        merge_length = 0
+        if (edit == INSERTION and prev_type == DELETION) or (
+            edit == DELETION and prev_type == INSERTION
+        ):
+            merge_length = min(prev_length, length)
+
+        if edit == DELETION:
+            # the last inserted bases become mismatches, as many deleted
+            # columns vanish
+            for j in range(k - merge_length, k):
+                edits[j] = MUTATION
+            insertion_ct -= merge_length
+            mutation_ct += merge_length
+            if merge_length > 0:
+                insertions[n_insertions - 1, 1] -= merge_length
+                if insertions[n_insertions - 1, 1] == 0:
+                    n_insertions -= 1
+            for j in range(length - merge_length):
+                symbols[k] = SPACE
+                edits[k] = DELETION
+                k += 1
+            deletion_ct += length - merge_length
+        elif edit == INSERTION:
+            # the last deleted columns vanish, as many inserted bases become
+            # mismatches
+            k -= merge_length
+            deletion_ct -= merge_length
+            for j in range(i, i + merge_length):
+                symbols[k] = query[j]
+                edits[k] = MUTATION
+                k += 1
+            mutation_ct += merge_length
+            if length > merge_length:
+                insertions[n_insertions, 0] = k - insertion_ct
+                insertions[n_insertions, 1] = length - merge_length
+                n_insertions += 1
+            for j in range(i + merge_length, end):
+                symbols[k] = query[j]
+                edits[k] = INSERTION
+                k += 1
+            insertion_ct += length - merge_length
+        else:
+            for j in range(i, end):
+                symbols[k] = query[j]
+                edits[k] = edit
+                k += 1
+            if edit == MUTATION:
+                mutation_ct += length
+
+        prev_type = edit
+        prev_length = length - merge_length
+        edit = next_edit
+        i = end
+
+    counts = np.array([insertion_ct, deletion_ct, mutation_ct], np.int64)
+    return buf[:, :k], counts, insertions[:n_insertions]
+
+
+# compile (or load from cache) now so the first alignment does not pay for it
+build_alignment(np.zeros(2, np.uint8), np.zeros(2, np.uint8))
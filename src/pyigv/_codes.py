@@ -0,0 +1,31 @@
+import numpy as np
+
+# Scoring and character codes shared by the numba kernels and their
+# Biopython/NumPy fallbacks, so both backends always agree
+
+# Gap opening is slightly more costly than gap extension, which keeps
+# insertions/deletions adjacent
+OPEN_GAP_SCORE = -1.0
+EXTEND_GAP_SCORE = -1.0 + 1e-6
+# scores closer than this are ties; it must stay well below the 1e-6
+# extension bonus above, or split gaps would tie with adjacent ones
+EPSILON = 1e-9
+
+GAP = ord("-")
+SPACE = ord(" ")
+INSERTION = ord("I")
+DELETION = ord("D")
+MUTATION = ord("M")
+
+
+# ASCII codes of a string as a read-only uint8 array; sequences are stored as
+# one byte per character, so anything else is rejected
+def to_codes(seq: str) -> np.ndarray:
+    try:
+        data = seq.encode("ascii")
+    except UnicodeEncodeError as error:
+        raise ValueError(
+            "only ASCII sequences are supported, got "
+            f"{seq[error.start]!r} at position {error.start}"
+        ) from None
+    return np.frombuffer(data, dtype=np.uint8)
@@ -0,0 +1,245 @@
+import numpy as np
+
+from typing import Sequence
+
+from numba import njit, prange
+
+from ._codes import EPSILON, EXTEND_GAP_SCORE, GAP, OPEN_GAP_SCORE, to_codes
+
+# DP states, in the order Biopython's PairwiseAligner prefers them when
+# scores tie: M ends in an aligned pair, D in a deletion (target base against
+# a gap) and I in an insertion (query base against a gap)
+STATE_M = 0
+STATE_D = 1
+STATE_I = 2
+# the traceback stores, per cell, the state each of M/D/I came from in two
+# bits each, at these shifts
+SHIFT_M = 0
+SHIFT_D = 2
+SHIFT_I = 4
+
+
+# state with the best of three scores, preferring the earlier ones unless a
+# later one is better by more than EPSILON (Biopython's rule)
+@njit(cache=True, inline="always")
+def _best_of(score_m, score_d, score_i):
+    score = score_m
+    state = STATE_M
+    if score_d > score + EPSILON:
+        score = score_d
+        state = STATE_D
+    if score_i > score + EPSILON:
+        score = score_i
+        state = STATE_I
+    return score, state
+
+
+@njit(cache=True, inline="always")
+def _align_into(
+    target,
+    query,
+    open_gap_score,
+    extend_gap_score,
+    M_row,
+    D_row,
+    I_row,
+    trace,
+    target_out,
+    query_out,
+):
+    # Global (Needleman-Wunsch) alignment with affine gaps (Gotoh), computed
+    # and traced back exactly as Biopython's PairwiseAligner does, so both
+    # backends return the same alignment when several are optimal.
+    # Scores are kept in three rolling rows (M_row, D_row, I_row: at least
+    # len(query) + 1 floats each), updated in place; only the traceback is
+    # stored in full (trace: at least (len(target) + 1) x (len(query) + 1)
+    # bytes).
+    # The gapped sequences are written to target_out/query_out, which must hold
+    # at least len(target) + len(query) bytes; returns the alignment length.
+    m = target.shape[0]
+    n = query.shape[0]
+    neg_inf = -np.inf
+
+    # first row: only leading insertions
+    M_row[0] = 0.0
+    D_row[0] = neg_inf
+    I_row[0] = neg_inf
+    for j in range(1, n + 1):
+        M_row[j] = neg_inf
+        D_row[j] = neg_inf
+        I_row[j] = open_gap_score + (j - 1) * extend_gap_score
+        trace[0, j] = (STATE_M if j == 1 else STATE_I) << SHIFT_I
+
+    for i in range(1, m + 1):
+        t = target[i - 1]
+        # scores of cell (i - 1, j - 1), before the row is overwritten
+        M_diag = M_row[0]
+        D_diag = D_row[0]
+        I_diag = I_row[0]
+        # first column: only leading deletions
+        M_row[0] = neg_inf
+        D_row[0] = open_gap_score + (i - 1) * extend_gap_score
+        I_row[0] = neg_inf
+        trace[i, 0] = (STATE_M if i == 1 else STATE_D) << SHIFT_D
+        for j in range(1, n + 1):
+            # aligned pair: match scores 1, mismatch scores 0
+            score, state = _best_of(M_diag, D_diag, I_diag)
+            flags = state << SHIFT_M
+            M_diag = M_row[j]
+            M_row[j] = score + (1.0 if t == query[j - 1] else 0.0)
+
+            # deletion: move down the column from (i - 1, j)
+            score, state = _best_of(
+                M_diag + open_gap_score,
+                D_row[j] + extend_gap_score,
+                I_row[j] + open_gap_score,
+            )
+            flags |= state << SHIFT_D
+            D_diag = D_row[j]
+            D_row[j] = score
+
+            # insertion: move along the row from (i, j - 1)
+            score, state = _best_of(
+                M_row[j - 1] + open_gap_score,
+                D_row[j - 1] + open_gap_score,
+                I_row[j - 1] + extend_gap_score,
+            )
+            flags |= state << SHIFT_I
+            I_diag = I_row[j]
+            I_row[j] = score
+
+            trace[i, j] = flags
+
+    # end in the first state within EPSILON of the best final score
+    best = max(M_row[n], D_row[n], I_row[n])
+    if M_row[n] >= best - EPSILON:
+        state = STATE_M
+    elif D_row[n] >= best - EPSILON:
+        state = STATE_D
+    else:
+        state = STATE_I
+
+    # trace back from the bottom-right corner, writing the alignment reversed
+    k = 0
+    i = m
+    j = n
+    while i > 0 or j > 0:
+        flags = trace[i, j]
+        if state == STATE_M:
+            target_out[k] = target[i - 1]
+            query_out[k] = query[j - 1]
+            state = (flags >> SHIFT_M) & 3
+            i -= 1
+            j -= 1
+        elif state == STATE_D:
+            target_out[k] = target[i - 1]
+            query_out[k] = GAP
+            state = (flags >> SHIFT_D) & 3
+            i -= 1
+        else:
+            target_out[k] = GAP
+            query_out[k] = query[j - 1]
+            state = (flags >> SHIFT_I) & 3
+            j -= 1
+        k += 1
+
+    target_out[:k] = target_out[:k][::-1].copy()
+    query_out[:k] = query_out[:k][::-1].copy()
+    return k
+
+
+@njit(cache=True)
+def _nw_kernel(target, query, open_gap_score, extend_gap_score):
+    m = target.shape[0]
+    n = query.shape[0]
+    target_out = np.empty(m + n, np.uint8)
+    query_out = np.empty(m + n, np.uint8)
+    k = _align_into(
+        target,
+        query,
+        open_gap_score,
+        extend_gap_score,
+        np.empty(n + 1, np.float64),
+        np.empty(n + 1, np.float64),
+        np.empty(n + 1, np.float64),
+        np.empty((m + 1, n + 1), np.uint8),
+        target_out,
+        query_out,
+    )
+    return target_out[:k], query_out[:k]
+
+
+# aligns every query (concatenated in queries, query i spanning
+# queries[query_offsets[i]:query_offsets[i + 1]]) against the same target in
+# parallel; alignment i is written at out_offsets[i] of the output buffers
+@njit(cache=True, parallel=True)
+def _nw_batch_kernel(target, queries, query_offsets, open_gap_score, extend_gap_score):
+    n_queries = query_offsets.shape[0] - 1
+    m = target.shape[0]
+    out_offsets = np.empty(n_queries + 1, np.int64)
+    out_offsets[0] = 0
+    for i in range(n_queries):
+        query_length = query_offsets[i + 1] - query_offsets[i]
+        out_offsets[i + 1] = out_offsets[i] + m + query_length
+    target_out = np.empty(out_offsets[n_queries], np.uint8)
+    query_out = np.empty(out_offsets[n_queries], np.uint8)
+    lengths = np.empty(n_queries, np.int64)
+
+    for i in prange(n_queries):
+        n = query_offsets[i + 1] - query_offsets[i]
+        lengths[i] = _align_into(
+            target,
+            queries[query_offsets[i] : query_offsets[i + 1]],
+            open_gap_score,
+            extend_gap_score,
+            np.empty(n + 1, np.float64),
+            np.empty(n + 1, np.float64),
+            np.empty(n + 1, np.float64),
+            np.empty((m + 1, n + 1), np.uint8),
+            target_out[out_offsets[i] : out_offsets[i + 1]],
+            query_out[out_offsets[i] : out_offsets[i + 1]],
+        )
+    return target_out, query_out, out_offsets, lengths
+
+
+# aligns target and query globally; returns the two gapped strings
+def nw_align(
+    target: str,
+    query: str,
+    open_gap_score: float = OPEN_GAP_SCORE,
+    extend_gap_score: float = EXTEND_GAP_SCORE,
+):
+    target_aligned, query_aligned = _nw_kernel(
+        to_codes(target), to_codes(query), open_gap_score, extend_gap_score
+    )
+    return [target_aligned.tobytes().decode(), query_aligned.tobytes().decode()]
+
+
+# aligns every query against the same target; returns one [target, query]
+# pair of gapped strings per query
+def nw_align_batch(
+    target: str,
+    queries: Sequence[str],
+    open_gap_score: float = OPEN_GAP_SCORE,
+    extend_gap_score: float = EXTEND_GAP_SCORE,
+):
+    query_offsets = np.zeros(len(queries) + 1, np.int64)
+    np.cumsum([len(query) for query in queries], out=query_offsets[1:])
+    target_out, query_out, out_offsets, lengths = _nw_batch_kernel(
+        to_codes(target),
+        to_codes("".join(queries)),
+        query_offsets,
+        open_gap_score,
+        extend_gap_score,
+    )
+    target_aligned = target_out.tobytes()
+    query_aligned = query_out.tobytes()
+    alignments = []
+    for start, length in zip(out_offsets[:-1].tolist(), lengths.tolist()):
+        alignments.append(
+            [
+                target_aligned[start : start + length].decode(),
+                query_aligned[start : start + length].decode(),
+            ]
+        )
+    return alignments
@@ -0,0 +1,27 @@
+import numpy as np
+
+from numba import njit
+
+
+# run-length encodes a uint8 array into maximal runs [start, end) of equal codes
+@njit(cache=True)
+def rle_u8(codes):
+    n = codes.shape[0]
+    starts = np.empty(n, np.int32)
+    ends = np.empty(n, np.int32)
+    types = np.empty(n, np.uint8)
+    k = 0
+    for i in range(n):
+        if i == 0 or codes[i] != codes[i - 1]:
+            if k > 0:
+                ends[k - 1] = i
+            starts[k] = i
+            types[k] = codes[i]
+            k += 1
+    if k > 0:
+        ends[k - 1] = n
+    return starts[:k], ends[:k], types[:k]
+
+
+# compile (or load from cache) now so the first alignment does not pay for it
+rle_u8(np.zeros(2, np.uint8))
@@ -1,45 +1,231 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
-from matplotlib.colors import ListedColormap
-from typing import Sequence, Optional
-from Bio import Align
+from operator import attrgetter
+from types import MappingProxyType
+from typing import TYPE_CHECKING, List, Sequence, Optional
+
+from ._codes import (
+    DELETION,
+    EPSILON,
+    EXTEND_GAP_SCORE,
+    GAP,
+    INSERTION,
+    MUTATION,
+    OPEN_GAP_SCORE,
+    SPACE,
+    to_codes,
+)
+
+# matplotlib, Biopython and numba are slow to import and only some code paths
+# need them, so they are imported on first use
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+    from Bio import Align
+    from matplotlib.colors import ListedColormap
+
+# numba kernels, set by load_kernels(); nw_align and nw_align_batch stay None
+# when numba is not installed
+nw_align = None
+nw_align_batch = None
+rle_u8 = None
+build_alignment = None
+
+
+def _plt():
+    global plt
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def _align():
+    global Align
+    from Bio import Align
+
+    return Align
+
+
+# keeps `pyigv.alignment.plt` and `pyigv.alignment.Align` working, and
+# provides `pyigv.alignment.COLOR_CMAP`
+def __getattr__(name):
+    if name == "plt":
+        return _plt()
+    if name == "Align":
+        return _align()
+    if name == "COLOR_CMAP":
+        return _color_cmap()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# NumPy equivalent of _rle.rle_u8, used when numba is not installed
+def _rle_u8_numpy(codes):
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])[: len(codes)]
+    ends = np.r_[starts[1:], len(codes)][: len(starts)]
+    return starts.astype(np.int32), ends.astype(np.int32), codes[starts]
+
+
+# NumPy equivalent of _build.build_alignment, used when numba is not installed
+def _build_alignment_numpy(target_codes, query_codes):
+    # classify every column of the alignment at once
+    length = min(len(target_codes), len(query_codes))
+    target_codes = target_codes[:length]
+    query_codes = query_codes[:length]
+
+    match = target_codes == query_codes
+    insertion = (target_codes == GAP) & ~match
+    deletion = (query_codes == GAP) & ~match
+
+    # matches, insertions and mismatches all show the query base
+    symbols = np.where(deletion, SPACE, query_codes).astype(np.uint8)
+    edits = np.full(length, MUTATION, dtype=np.uint8)
+    edits[match] = SPACE
+    edits[insertion] = INSERTION
+    edits[deletion] = DELETION
+
+    # merge adjacent insertions and deletions into mismatches, working on
+    # runs of equal edits rather than on single columns
+    keep = np.ones(length, dtype=bool)
+    if length:
+        starts, ends, types = _rle_u8_numpy(edits)
+        indel = (types == INSERTION) | (types == DELETION)
+        # adjacent runs always differ in type, so these are I/D or D/I pairs
+        pairs = np.flatnonzero(indel[:-1] & indel[1:])
+        # start of what is left of each run after merging with its predecessor
+        remaining = starts.copy()
+        for k in pairs:
+            prev_start, prev_end = remaining[k], ends[k]
+            start, end = starts[k + 1], ends[k + 1]
+            merge_length = min(prev_end - prev_start, end - start)
+            if types[k] == INSERTION:
+                # inserted bases become mismatches, deleted columns vanish
+                edits[prev_end - merge_length : prev_end] = MUTATION
+                keep[start : start + merge_length] = False
+            else:
+                keep[prev_end - merge_length : prev_end] = False
+                edits[start : start + merge_length] = MUTATION
+            remaining[k + 1] = start + merge_length
+
+    buf = np.stack([symbols[keep], edits[keep]])
+
+    # counts and insertion blocks both come from the runs of the final edits
+    starts, ends, types = _rle_u8_numpy(buf[1])
+    run_lengths = ends - starts
+    counts = np.bincount(types, weights=run_lengths, minlength=256).astype(np.int64)
+    counts = counts[[INSERTION, DELETION, MUTATION]]
+
+    is_insertion = types == INSERTION
+    insert_lengths = run_lengths[is_insertion]
+    inserted_before = np.cumsum(insert_lengths) - insert_lengths
+    insertions = np.stack(
+        [starts[is_insertion] - inserted_before, insert_lengths], axis=1
+    )
+    return buf, counts, insertions
+
+
+def load_kernels():
+    global nw_align, nw_align_batch, rle_u8, build_alignment
+    if rle_u8 is not None:
+        return
+    try:
+        from ._nw import nw_align, nw_align_batch
+        from ._rle import rle_u8
+        from ._build import build_alignment
+    except ImportError:  # numba is not installed, fall back to Biopython/NumPy
+        rle_u8 = _rle_u8_numpy
+        build_alignment = _build_alignment_numpy
+
 
 mismatch_colors = {"A": "green", "T": "red", "G": "gold", "C": "blue"}
 
+# colors of the plot's colormap; rows are drawn as indices into this tuple
+COLORS_LIST = ("green", "red", "gold", "blue", "gray", "white")
+COLOR_TO_INDEX = MappingProxyType({color: idx for idx, color in enumerate(COLORS_LIST)})
+
+# color index of every base, indexed by its ASCII code (gray for anything
+# other than A/T/G/C)
+BASE_COLOR_IDX = np.full(256, COLOR_TO_INDEX["gray"], dtype=np.uint8)
+for base, color in mismatch_colors.items():
+    BASE_COLOR_IDX[ord(base)] = COLOR_TO_INDEX[color]
+
+# color index of every (symbol, edit) pair, indexed by their ASCII codes:
+# deletions are white, matches gray, and mismatches/insertions take the
+# color of their base
+COLOR_LUT = np.full((256, 256), COLOR_TO_INDEX["white"], dtype=np.uint8)
+COLOR_LUT[:, SPACE] = COLOR_TO_INDEX["gray"]
+COLOR_LUT[:, MUTATION] = BASE_COLOR_IDX
+COLOR_LUT[:, INSERTION] = BASE_COLOR_IDX
+
+_color_cmap_obj = None
+
+
+# ListedColormap of COLORS_LIST (`pyigv.alignment.COLOR_CMAP`), created on
+# first use since matplotlib is imported lazily
+def _color_cmap() -> "ListedColormap":
+    global _color_cmap_obj
+    if _color_cmap_obj is None:
+        from matplotlib.colors import ListedColormap
+
+        _color_cmap_obj = ListedColormap(COLORS_LIST, name="pyigv")
+    return _color_cmap_obj
+
+
+_default_aligner = None
+
+
+# Biopython aligner shared by all Alignment instances; align() returns a fresh
+# Alignments object on every call, so reusing it across inputs is safe
+def get_default_aligner() -> "Align.PairwiseAligner":
+    global _default_aligner
+    if _default_aligner is None:
+        aligner = _align().PairwiseAligner()
+        # Set gap penalties to encourage keeping insertions/deletions adjacent
+        aligner.open_gap_score = OPEN_GAP_SCORE
+        aligner.extend_gap_score = EXTEND_GAP_SCORE
+        aligner.epsilon = EPSILON
+        _default_aligner = aligner
+    return _default_aligner
+
 
 class Alignment:
-    def block_indices(self, edits):
-        if not edits:
-            return
-
-        start = 0
-        current_type = edits[0]
-
-        for i, t in enumerate(edits):
-            if t != current_type:
-                # Yield the current block [start, i) and its type.
-                yield start, i, current_type
-                # Reset the block.
-                start = i
-                current_type = t
-            # Yield the final block.
-        yield start, len(edits), current_type
+    # yields (start, end, type) for every maximal block of equal edits
+    # edits may be an integer array of codes, a string, or a sequence of 1-char strings
+    def block_indices(self, edits=None):
+        if edits is None:
+            codes = self._buf[1]
+        elif isinstance(edits, np.ndarray) and np.issubdtype(edits.dtype, np.integer):
+            if edits.size and (edits.min() < 0 or edits.max() > 255):
+                raise ValueError("edit codes must be between 0 and 255")
+            codes = np.asarray(edits, dtype=np.uint8)
+        elif isinstance(edits, str):
+            codes = to_codes(edits)
+        else:
+            edits = list(edits)
+            joined = "".join(edits)
+            if len(joined) != len(edits):
+                i, edit = next((i, e) for i, e in enumerate(edits) if len(e) != 1)
+                raise ValueError(
+                    f"edits must be single characters, got {edit!r} at position {i}"
+                )
+            codes = to_codes(joined)
+        starts, ends, types = rle_u8(codes)
+        return zip(starts.tolist(), ends.tolist(), map(chr, types.tolist()))
 
     # input alignment is an array-like object with two strings of the form "(Σ∪{-})*"
-    # if alignment is None, uses Biopython PairwiseAligner to generate alignment
+    # if alignment is None, aligns with the numba Needleman-Wunsch kernel, or
+    # Biopython PairwiseAligner when numba is unavailable
     def __init__(
         self,
         target: str,
         query: str,
         alignment: Optional[Sequence[str]] = None,
     ):
-        # If alignment is None, generate alignment using Biopython PairwiseAligner
-        if alignment is None:
-            aligner = Align.PairwiseAligner()
-            # Set gap penalties to encourage keeping insertions/deletions adjacent
-            # Gap opening is more costly than gap extension
-            alignments = aligner.align(target, query)
+        load_kernels()
+
+        # If alignment is None, generate a global alignment
+        if alignment is None and nw_align is not None:
+            alignment = nw_align(target, query, OPEN_GAP_SCORE, EXTEND_GAP_SCORE)
+        elif alignment is None:
+            alignments = get_default_aligner().align(target, query)
             # Get the first (best) alignment
             alignment = alignments[0]
 
@@ -48,77 +234,44 @@ class Alignment:
         self.query = query
         self.target = target
 
-        # target and query base
-        symbols = []
-        edits = []
-        for target_base, query_base in zip(alignment[0], alignment[1]):
-            if target_base == query_base:
-                symbols.append(target_base)
-                edits.append(" ")  # match
-            elif target_base == "-":
-                symbols.append(query_base)
-                edits.append("I")
-            elif query_base == "-":
-                symbols.append(" ")
-                edits.append("D")
-            else:
-                # Mismatch (substitution)
-                symbols.append(query_base)
-                edits.append("M")
-
-        # merge adjacent insertions and deletions
-
-        # create generator of type block indices
-        writeIdx = 0
-        prev_start = 0
-        prev_end = 0
-        prev_type = "C"
-        for start, end, type in self.block_indices(edits):
-            if (type == "I" and prev_type == "D") or (type == "D" and prev_type == "I"):
-                prev_length = prev_end - prev_start
-                curr_length = end - start
-                merge_length = min(prev_length, curr_length)
-                for j in range(prev_start, prev_end - merge_length):
-                    symbols[writeIdx] = symbols[j]
-                    edits[writeIdx] = edits[j]
-                    writeIdx += 1
-
-                if prev_type == "I":
-                    for j in range(prev_end - merge_length, prev_end):
-                        symbols[writeIdx] = symbols[j]
-                        edits[writeIdx] = "M"
-                        writeIdx += 1
-                else:
-                    for k in range(merge_length):
-                        symbols[writeIdx] = symbols[start + k]
-                        edits[writeIdx] = "M"
-                        writeIdx += 1
-
-                prev_start = start + merge_length
-                prev_end = end
-                prev_type = type
+        # symbols (row 0) and edits (row 1) as ASCII codes in one contiguous
+        # buffer; the string views below are decoded on demand. Edits never
+        # change after construction, so the counts and the start (in target
+        # coordinates) and length of every insertion block are computed once.
+        self._buf, counts, insertions = build_alignment(
+            to_codes(alignment[0]), to_codes(alignment[1])
+        )
+        self.insertion_ct, self.deletion_ct, self.mutation_ct = counts.tolist()
+        # orders by insertions, then mismatches, then deletions; each count gets
+        # its own 64-bit field so sorting compares a single integer
+        self._sort_key = (
+            (self.insertion_ct << 128) | (self.mutation_ct << 64) | self.deletion_ct
+        )
+        self._insertion_indices = insertions.tolist()
+
+    # aligns every query against the same target, in parallel when numba is
+    # available; returns one Alignment per query, in order
+    @classmethod
+    def from_batch(cls, target: str, queries: Sequence[str]) -> List["Alignment"]:
+        load_kernels()
+        if nw_align_batch is None:
+            return [cls(target, query) for query in queries]
+        queries = list(queries)
+        alignments = nw_align_batch(target, queries, OPEN_GAP_SCORE, EXTEND_GAP_SCORE)
+        return [
+            cls(target, query, alignment)
+            for query, alignment in zip(queries, alignments)
+        ]
 
-            else:
-                for j in range(prev_start, prev_end):
-                    symbols[writeIdx] = symbols[j]
-                    edits[writeIdx] = edits[j]
-                    writeIdx += 1
-                prev_start = start
-                prev_end = end
-                prev_type = type
-
-        for j in range(prev_start, prev_end):
-            symbols[writeIdx] = symbols[j]
-            edits[writeIdx] = edits[j]
-            writeIdx += 1
-
-        self.symbols = symbols[:writeIdx]
-        self.edits = edits[:writeIdx]
-
-        # find edits/errors
-        self.insertion_ct = sum(1 for c in self.edits if c == "I")
-        self.deletion_ct = sum(1 for c in self.edits if c == "D")
-        self.mutation_ct = sum(1 for c in self.edits if c == "M")
+    # query symbol of every column (space for deletions)
+    @property
+    def symbols(self) -> str:
+        return self._buf[0].tobytes().decode()
+
+    # edit of every column: I=insertion, D=deletion, M=mismatch, space=match
+    @property
+    def edits(self) -> str:
+        return self._buf[1].tobytes().decode()
 
     def __str__(self):
         return (
@@ -126,70 +279,87 @@ class Alignment:
             + self.target
             + "\n"
             + " Query: "
-            + "".join(self.symbols)
+            + self.symbols
             + "\n"
             + " Edits: "
-            + "".join(self.edits)
+            + self.edits
         )
 
     def __repr__(self):
         return self.__str__()
 
     def __lt__(self, other):
-        return [self.insertion_ct, self.mutation_ct, self.deletion_ct] < [
-            other.insertion_ct,
-            other.mutation_ct,
-            other.deletion_ct,
-        ]
+        return self._sort_key < other._sort_key
 
-    def get_color_row(self, truncate: bool = False):
+    # returns the color index (into COLORS_LIST) of every column
+    def get_color_row(self, truncate: bool = False) -> np.ndarray:
+        symbols, edits = self._buf
         if truncate:
-            return [
-                (
-                    mismatch_colors.get(symbol, "gray")
-                    if edit == "M"
-                    else ("gray" if edit == " " else "white")
-                )
-                for symbol, edit in zip(self.symbols, self.edits)
-                if edit != "I"
-            ]
-
-        return [
-            (
-                mismatch_colors.get(symbol, "gray")
-                if (edit == "I" or edit == "M")
-                else ("gray" if edit == " " else "white")
-            )
-            for symbol, edit in zip(self.symbols, self.edits)
-        ]
+            kept = edits != INSERTION
+            symbols = symbols[kept]
+            edits = edits[kept]
+        return COLOR_LUT[symbols, edits]
 
     def get_symbols(self, truncate: bool = False):
         if truncate:
-            return [
-                symbol for symbol, edit in zip(self.symbols, self.edits) if edit != "I"
-            ]
-        return self.symbols
+            return list(self.get_symbol_codes(truncate).tobytes().decode())
+        return list(self.symbols)
+
+    # returns the ASCII codes of get_symbols() as a uint8 array
+    def get_symbol_codes(self, truncate: bool = False) -> np.ndarray:
+        if truncate:
+            return self._buf[0][self._buf[1] != INSERTION]
+        return self._buf[0]
 
-    # returns start index of all insertion regions
+    # returns start index and length of all insertion regions
     def get_insertion_indices(self):
-        curr_insert_ct = 0
-        indices = []
-        for start, end, edit in self.block_indices(self.edits):
-            if edit == "I":
-                indices.append([start - curr_insert_ct, end - start])
-                curr_insert_ct += end - start
-        return indices
+        return self._insertion_indices
+
+
+# Everything render_plot needs to draw a set of alignments: ASCII codes and
+# color indices of every cell (reference on the top row), and the
+# (position, length) insertions of every alignment row when truncating.
+# Instances are cached by prepare_plot, so the arrays are read-only.
+class PlotData:
+    def __init__(
+        self,
+        text_matrix: np.ndarray,
+        color_matrix: np.ndarray,
+        insertion_indices: List[List[List[int]]],
+    ):
+        text_matrix.setflags(write=False)
+        color_matrix.setflags(write=False)
+        self.text_matrix = text_matrix
+        self.color_matrix = color_matrix
+        self.insertion_indices = insertion_indices
+        self.n_rows = len(text_matrix) - 1
+        self.alignment_length = text_matrix.shape[1]
+
+
+# recently prepared plots, keyed by the ids of the (sorted) alignments and
+# truncate; each entry keeps its alignments alive so their ids stay unique
+PLOT_DATA_CACHE_SIZE = 8
+_plot_data_cache = {}
+
+
+# forgets all prepared plots, releasing their alignments and plot matrices
+def clear_plot_cache() -> None:
+    _plot_data_cache.clear()
 
 
 # alignments should be of type alignment
-def plot_alignments(
-    alignments,
-    title: Optional[str] = None,
-    pdf: Optional[str] = None,
-    truncate: bool = True,
-    return_fig: bool = False,
-) -> Optional[plt.Figure]:
-    alignments.sort()
+# rows are ordered by number of edits, unless sort is False; the caller's list
+# is never reordered
+def prepare_plot(alignments, truncate: bool = True, sort: bool = True) -> PlotData:
+    if sort:
+        alignments = sorted(alignments, key=attrgetter("_sort_key"))
+    else:
+        alignments = list(alignments)
+
+    key = (tuple(map(id, alignments)), truncate)
+    cached = _plot_data_cache.get(key)
+    if cached is not None:
+        return cached[1]
 
     expected_ref = alignments[0].target
     expected_len = len(expected_ref)
@@ -198,66 +368,170 @@ def plot_alignments(
     alignment_length = (
         len(expected_ref)
         if truncate
-        else max((len(aln.symbols) for aln in alignments), default=0)
+        else max((aln._buf.shape[1] for aln in alignments), default=0)
     )
 
-    color_rows = []
-    text_rows = []
+    # Characters as ASCII codes, padded with spaces; reference on the top row
+    text_matrix = np.full((n_rows + 1, alignment_length), SPACE, dtype=np.uint8)
+    text_matrix[0, :expected_len] = to_codes(expected_ref)
+    for i, aln in enumerate(alignments, start=1):
+        symbol_row = aln.get_symbol_codes(truncate)
+        text_matrix[i, : len(symbol_row)] = symbol_row
 
-    # Create expected reference row (top row)
-    top_color_row = [mismatch_colors.get(base, "gray") for base in expected_ref] + [
-        "white"
-    ] * (alignment_length - expected_len)
-    top_text_row = list(expected_ref) + [" "] * (alignment_length - expected_len)
-
-    # Standardize row length
-    def pad_row(row, length, fill="white"):
-        return row + [fill] * (length - len(row))
+    # Numeric color indices for imshow; rows are padded with white
+    color_matrix = np.full(
+        (n_rows + 1, alignment_length), COLOR_TO_INDEX["white"], dtype=np.uint8
+    )
+    color_matrix[0, :expected_len] = BASE_COLOR_IDX[to_codes(expected_ref)]
+    for i, aln in enumerate(alignments, start=1):
+        color_row = aln.get_color_row(truncate)
+        color_matrix[i, : len(color_row)] = color_row
 
-    color_rows = [pad_row(top_color_row, alignment_length)] + [
-        pad_row(aln.get_color_row(truncate), alignment_length) for aln in alignments
-    ]
-    text_rows = [pad_row(top_text_row, alignment_length, " ")] + [
-        pad_row(aln.get_symbols(truncate), alignment_length, " ") for aln in alignments
+    insertion_indices = [
+        aln.get_insertion_indices() if truncate else [] for aln in alignments
     ]
 
-    # Convert colors to numeric indices for matshow
-    colors_list = ["green", "red", "gold", "blue", "gray", "white"]
-    color_to_index = {color: idx for idx, color in enumerate(colors_list)}
-    color_matrix = np.array(
-        [[color_to_index.get(color, 0) for color in row] for row in color_rows]
-    )
-    text_matrix = text_rows  # already a list of lists
+    data = PlotData(text_matrix, color_matrix, insertion_indices)
+    if len(_plot_data_cache) >= PLOT_DATA_CACHE_SIZE:
+        del _plot_data_cache[next(iter(_plot_data_cache))]
+    _plot_data_cache[key] = (tuple(alignments), data)
+    return data
+
+
+# coverage (0-255) of every printable ASCII character drawn, as ax.text would
+# draw it, in the middle of a square cell of cell_size pixels; indexed by
+# ASCII code, blank for anything else; rendered once per cell size and dpi,
+# keeping the most recent GLYPH_CACHE_SIZE
+GLYPH_CACHE_SIZE = 8
+_glyph_cache = {}
+
+
+def _glyph_masks(cell_size: int, dpi: float) -> np.ndarray:
+    key = (cell_size, dpi)
+    masks = _glyph_cache.get(key)
+    if masks is None:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        from matplotlib.transforms import IdentityTransform
+
+        codes = np.arange(ord("!"), ord("~") + 1)
+        width = len(codes) * cell_size
+        # half a pixel of slack so the canvas is never rounded down
+        fig = Figure(
+            figsize=((width + 0.5) / dpi, (cell_size + 0.5) / dpi),
+            dpi=dpi,
+            facecolor="white",
+        )
+        canvas = FigureCanvasAgg(fig)
+        for k, code in enumerate(codes.tolist()):
+            fig.text(
+                (k + 0.5) * cell_size,
+                cell_size / 2,
+                chr(code),
+                transform=IdentityTransform(),
+                va="center",
+                ha="center",
+                fontsize=8,
+                color="black",
+            )
+        canvas.draw()
+
+        # black on white, so coverage is how dark each pixel got
+        pixels = np.asarray(canvas.buffer_rgba())[-cell_size:, :width, 0]
+        masks = np.zeros((256, cell_size, cell_size), dtype=np.uint8)
+        glyphs = (255 - pixels).reshape(cell_size, len(codes), cell_size)
+        masks[codes] = glyphs.transpose(1, 0, 2)
+        if len(_glyph_cache) >= GLYPH_CACHE_SIZE:
+            del _glyph_cache[next(iter(_glyph_cache))]
+        _glyph_cache[key] = masks
+    return masks
+
+
+# RGBA image of some rows of plot cells: every cell filled with its color,
+# with its character blended on top in the default text color
+def _cell_image(
+    text_rows: np.ndarray, color_rows: np.ndarray, cell_size: int, dpi: float
+) -> np.ndarray:
+    from matplotlib import rcParams
+    from matplotlib.colors import to_rgb
+
+    palette = _color_cmap()(np.arange(len(COLORS_LIST)), bytes=True)[:, :3]
+    palette = palette.astype(np.uint16)
+    text_color = np.round(np.array(to_rgb(rcParams["text.color"])) * 255)
+    text_color = text_color.astype(np.uint16)
+
+    # (row, y, column, x) layout, so the result reshapes straight into pixels
+    coverage = _glyph_masks(cell_size, dpi)[text_rows].transpose(0, 2, 1, 3)
+    coverage = coverage[..., np.newaxis].astype(np.uint16)
+    background = palette[color_rows][:, np.newaxis, :, np.newaxis, :]
+
+    n_rows, n_cols = text_rows.shape
+    image = np.full((n_rows, cell_size, n_cols, cell_size, 4), 255, dtype=np.uint8)
+    blended = background * (255 - coverage) + text_color * coverage
+    image[..., :3] = (blended + 127) // 255
+    return image.reshape(n_rows * cell_size, n_cols * cell_size, 4)
+
+
+# matplotlib resamples images in float RGBA, so the cells are drawn as several
+# images of at most this many pixels each rather than one canvas-sized image
+CELL_IMAGE_PIXELS = 1 << 22
+# cells are rasterized at this many times the figure's resolution (or at
+# savefig.dpi, if higher), so saving at a higher dpi downsamples rather than
+# upsamples them; large plots fall back towards 1x to keep all cell images
+# within CELL_IMAGE_TOTAL_PIXELS
+CELL_SUPERSAMPLE = 3
+CELL_IMAGE_TOTAL_PIXELS = 1 << 24
+
+
+# pixel size at which to rasterize each cell, given its size on the figure
+def _raster_cell_size(screen_cell_size: float, n_cells: int, dpi: float) -> int:
+    from matplotlib import rcParams
+
+    scale = CELL_SUPERSAMPLE
+    savefig_dpi = rcParams["savefig.dpi"]
+    if savefig_dpi != "figure":
+        scale = max(scale, savefig_dpi / dpi)
+    cell_size = round(screen_cell_size * scale)
+    budget_cell_size = int((CELL_IMAGE_TOTAL_PIXELS / n_cells) ** 0.5)
+    return max(1, round(screen_cell_size), min(cell_size, budget_cell_size))
+
+
+def render_plot(
+    data: PlotData,
+    title: Optional[str] = None,
+    pdf: Optional[str] = None,
+    return_fig: bool = False,
+) -> Optional["plt.Figure"]:
+    plt = _plt()
+
+    n_rows = data.n_rows
+    alignment_length = data.alignment_length
 
-    # print("Color_matrix\n", color_matrix)
-    # print("text_matrix\n", text_matrix)
     # Plot
     fig_width = max(10, alignment_length * 0.3)
     fig_height = max(2, (n_rows + 1) * 0.5)
     fig, ax = plt.subplots(figsize=(fig_width, fig_height))
-    ax.matshow(color_matrix, cmap=ListedColormap(colors_list))
-
-    # Add text
-    for i in range(len(text_matrix)):
-        if i > 0 and truncate:
-            insert_indices = alignments[i - 1].get_insertion_indices()
-            for j, insert_length in insert_indices:
-                ax.text(
-                    j - 0.5,
-                    i,
-                    f"{insert_length}",
-                    va="center",
-                    ha="center",
-                    fontsize=8,
-                    color="white",
-                    bbox=dict(
-                        facecolor="purple", edgecolor="none", boxstyle="round,pad=0.2"
-                    ),
-                )
-        for j in range(alignment_length):
-            c = text_matrix[i][j]
-            if c:
-                ax.text(j, i, c, va="center", ha="center", fontsize=8)
+    # One data unit per cell, cell (i, j) centered on (j, i), as imshow lays
+    # out a matrix
+    ax.set_xlim(-0.5, alignment_length - 0.5)
+    ax.set_ylim(n_rows + 0.5, -0.5)
+    ax.set_aspect("equal")
+
+    # Insertion boxes are the only text artists; there are few of them
+    for i, insert_indices in enumerate(data.insertion_indices, start=1):
+        for j, insert_length in insert_indices:
+            ax.text(
+                j - 0.5,
+                i,
+                f"{insert_length}",
+                va="center",
+                ha="center",
+                fontsize=8,
+                color="white",
+                bbox=dict(
+                    facecolor="purple", edgecolor="none", boxstyle="round,pad=0.2"
+                ),
+            )
 
     ax.set_xticks([])
     ax.set_yticks([])
@@ -276,6 +550,31 @@ def plot_alignments(
     )
     plt.tight_layout()
 
+    # Add cells: now that the layout is fixed, draw them with their characters
+    # as images, supersampled from the size a cell takes on the figure, rather
+    # than adding one text artist per cell
+    if alignment_length:
+        ax.apply_aspect()
+        screen_cell_size = ax.get_window_extent().width / alignment_length
+        cell_size = _raster_cell_size(
+            screen_cell_size, (n_rows + 1) * alignment_length, fig.dpi
+        )
+        # glyphs keep their point size relative to the cell
+        raster_dpi = fig.dpi * cell_size / screen_cell_size
+        tile_rows = max(1, CELL_IMAGE_PIXELS // (alignment_length * cell_size**2))
+        for start in range(0, n_rows + 1, tile_rows):
+            stop = min(start + tile_rows, n_rows + 1)
+            ax.imshow(
+                _cell_image(
+                    data.text_matrix[start:stop],
+                    data.color_matrix[start:stop],
+                    cell_size,
+                    raster_dpi,
+                ),
+                extent=(-0.5, alignment_length - 0.5, stop - 0.5, start - 0.5),
+                interpolation="antialiased",
+            )
+
     if pdf:
         pdf.savefig()
     else:
@@ -283,5 +582,17 @@ def plot_alignments(
 
     if return_fig:
         return fig
-    
+
     return None
+
+
+# alignments should be of type alignment; prepare_plot followed by render_plot
+def plot_alignments(
+    alignments,
+    title: Optional[str] = None,
+    pdf: Optional[str] = None,
+    truncate: bool = True,
+    return_fig: bool = False,
+    sort: bool = True,
+) -> Optional["plt.Figure"]:
+    return render_plot(prepare_plot(alignments, truncate, sort), title, pdf, return_fig)
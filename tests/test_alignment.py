@@ -1,9 +1,20 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
 import matplotlib
 
 matplotlib.use("Agg")  # Use non-interactive backend for testing
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
-from pyigv import Alignment, plot_alignments
+from pyigv import (
+    Alignment,
+    clear_plot_cache,
+    plot_alignments,
+    prepare_plot,
+    render_plot,
+)
 
 
 def test_alignment_basic():
@@ -61,6 +72,36 @@ def test_alignment_multi_mutation_counting():
     assert aln.deletion_ct == 0
 
 
+def test_alignment_symbols_and_edits():
+    """Test per-column symbols and edits, including merged insertion/deletion"""
+    target = "ACGTA"
+    query = "ACTGCA"
+    alignment = ["AC-GT-A", "ACTG-CA"]
+
+    aln = Alignment(target, query, alignment)
+
+    assert aln.symbols == "ACTGCA"
+    assert aln.edits == "  I M "
+    assert aln.insertion_ct == 1
+    assert aln.deletion_ct == 0
+    assert aln.mutation_ct == 1
+
+
+def test_alignment_chained_merge():
+    """Test that a deletion/insertion/deletion chain merges into mismatches"""
+    target = "ACGGA"
+    query = "ATTTA"
+    alignment = ["AC---GGA", "A-TTT--A"]
+
+    aln = Alignment(target, query, alignment)
+
+    assert aln.symbols == "ATTTA"
+    assert aln.edits == " MMM "
+    assert aln.mutation_ct == 3
+    assert aln.insertion_ct == 0
+    assert aln.deletion_ct == 0
+
+
 def test_alignment_insertion():
     """Test insertion detection"""
     target = "AAAA"
@@ -96,6 +137,19 @@ def test_alignment_comparison():
     assert aln1 < aln2
 
 
+def test_alignment_sort_order():
+    """Test that alignments sort by insertions, then mismatches, then deletions"""
+    target = "AAAA"
+    deletions = Alignment(target, "AA", ["AAAA", "AA--"])
+    mismatch = Alignment(target, "AAAT", ["AAAA", "AAAT"])
+    insertion = Alignment(target, "AAAAA", ["AAAA-", "AAAAA"])
+
+    ordered = sorted([insertion, deletions, mismatch])
+
+    assert ordered == [deletions, mismatch, insertion]
+    assert not insertion < mismatch
+
+
 def test_alignment_str():
     """Test string representation"""
     target = "AAAA"
@@ -119,8 +173,23 @@ def test_get_color_row():
     aln = Alignment(target, query, alignment)
     color_row = aln.get_color_row()
 
-    assert isinstance(color_row, list)
+    assert isinstance(color_row, np.ndarray)
     assert len(color_row) > 0
+    # matches are gray, the T mismatch is red
+    assert color_row.tolist() == [4, 4, 4, 1]
+
+
+def test_get_color_row_truncate():
+    """Test that truncated color rows drop insertions"""
+    target = "AAAA"
+    query = "ACAAG"
+    alignment = ["A-AAA", "ACAA-"]
+
+    aln = Alignment(target, query, alignment)
+
+    # insertion of C (blue) is shown only in the full row; deletion is white
+    assert aln.get_color_row().tolist() == [4, 3, 4, 4, 5]
+    assert aln.get_color_row(truncate=True).tolist() == [4, 4, 4, 5]
 
 
 def test_get_symbols():
@@ -146,6 +215,19 @@ def test_get_insertion_indices():
     indices = aln.get_insertion_indices()
 
     assert isinstance(indices, list)
+    assert indices == [[4, 1]]
+
+
+def test_get_insertion_indices_multiple():
+    """Test insertion indices are given in target coordinates"""
+    target = "AAAAAA"
+    query = "AACCAAAGGGA"
+    alignment = ["AA--AAA---A", "AACCAAAGGGA"]
+
+    aln = Alignment(target, query, alignment)
+
+    assert aln.get_insertion_indices() == [[2, 2], [5, 3]]
+    assert aln.insertion_ct == 5
 
 
 def test_plot_alignments_basic():
@@ -166,6 +248,133 @@ def test_plot_alignments_basic():
     plt.close(fig)
 
 
+def test_plot_alignments_colors_without_white_cells():
+    """Test that base colors do not shift when no cell is white"""
+    aln = Alignment("ACGT", "ACGT", ["ACGT", "ACGT"])
+
+    fig = plot_alignments([aln], return_fig=True)
+    pixels = np.asarray(fig.axes[0].images[0].get_array())
+    # corner pixel of every top row cell, clear of its character
+    cell_size = pixels.shape[1] // 4
+    top_row = pixels[0, ::cell_size] / 255
+
+    expected = matplotlib.colors.to_rgba_array(["green", "blue", "gold", "red"])
+    assert np.allclose(top_row, expected, atol=1 / 255)
+    plt.close(fig)
+
+
+def test_color_constants():
+    """Test the module-level color table and colormap"""
+    from pyigv import alignment
+
+    assert alignment.COLORS_LIST == ("green", "red", "gold", "blue", "gray", "white")
+    assert alignment.COLOR_TO_INDEX["white"] == 5
+    with pytest.raises(TypeError):
+        alignment.COLOR_TO_INDEX["white"] = 0
+
+    cmap = alignment.COLOR_CMAP
+    assert cmap is alignment.COLOR_CMAP
+    assert np.allclose(
+        cmap(np.arange(6)), matplotlib.colors.to_rgba_array(alignment.COLORS_LIST)
+    )
+
+
+def test_prepare_plot_and_render_plot():
+    """Test that plot data is built once and can be rendered repeatedly"""
+    target = "AAATAAA"
+    aln1 = Alignment(target, "AAAGGAAA", ["AAA-TAAA", "AAAGGAAA"])
+    aln2 = Alignment(target, "AAATAAA", ["AAATAAA", "AAATAAA"])
+
+    data = prepare_plot([aln1, aln2])
+    assert data.n_rows == 2
+    assert data.alignment_length == len(target)
+    # rows are sorted by number of edits
+    assert data.text_matrix[1].tobytes() == b"AAATAAA"
+    assert data.text_matrix[2].tobytes() == b"AAAGAAA"
+    assert data.insertion_indices == [[], [[3, 1]]]
+
+    assert prepare_plot([aln2, aln1]) is data
+    untruncated = prepare_plot([aln1, aln2], truncate=False)
+    assert untruncated is not data
+    assert untruncated.alignment_length == len(aln1.symbols)
+    assert prepare_plot([aln2, Alignment(target, "AAATAAA")]) is not data
+
+    clear_plot_cache()
+    assert prepare_plot([aln1, aln2]) is not data
+
+    for title in ("first", "second"):
+        fig = render_plot(data, title=title, return_fig=True)
+        assert fig.axes[0].get_title() == f"{title} | Alignments: 2"
+        plt.close(fig)
+
+
+def test_prepare_plot_sort():
+    """Test that rows are sorted without reordering the caller's list"""
+    target = "AAATAAA"
+    edited = Alignment(target, "AAAGAAA", ["AAATAAA", "AAAGAAA"])
+    exact = Alignment(target, "AAATAAA", ["AAATAAA", "AAATAAA"])
+    alignments = [edited, exact]
+
+    data = prepare_plot(alignments)
+    assert alignments == [edited, exact]
+    assert data.text_matrix[1].tobytes() == b"AAATAAA"
+
+    data = prepare_plot(alignments, sort=False)
+    assert data.text_matrix[1].tobytes() == b"AAAGAAA"
+    assert data.text_matrix[2].tobytes() == b"AAATAAA"
+
+
+def test_plot_alignments_draws_characters_into_image():
+    """Test that characters are drawn into the image, not as text artists"""
+    target = "AAATAAA"
+    aln = Alignment(target, "AAAGGAAA", ["AAA-TAAA", "AAAGGAAA"])
+
+    fig = plot_alignments([aln], return_fig=True)
+    ax = fig.axes[0]
+    # only the insertion box is a text artist
+    assert [text.get_text() for text in ax.texts] == ["1"]
+
+    # cells keep their matrix coordinates
+    assert ax.get_xlim() == (-0.5, len(target) - 0.5)
+    assert ax.get_ylim() == (1.5, -0.5)
+
+    pixels = np.asarray(ax.images[0].get_array())
+    cell_size = pixels.shape[1] // len(target)
+    assert pixels.shape == (2 * cell_size, len(target) * cell_size, 4)
+    # cells with a character hold darker pixels than their background
+    cell = pixels[cell_size:, :cell_size].astype(int)
+    assert cell.sum(axis=2).min() < cell[0, 0].sum()
+    plt.close(fig)
+
+
+def test_plot_alignments_cells_resolve_at_higher_save_dpi(tmp_path):
+    """Test that cells are rasterized at least as finely as a 2x dpi save"""
+    target = "AAACCCGGGTTTATATATAT"
+    aln = Alignment(target, "AAACCCGGGTTTTATATAT")
+
+    fig = plot_alignments([aln], return_fig=True)
+    ax = fig.axes[0]
+    pixels = np.asarray(ax.images[0].get_array())
+    saved_cell_width = 2 * ax.get_window_extent().width / len(target)
+    assert pixels.shape[1] / len(target) >= saved_cell_width
+
+    # the query's first "A" (on gray) stays crisp when saved at twice the dpi:
+    # an upsampled 1x glyph has more blurred edge pixels than inked ones
+    fig.savefig(tmp_path / "plot.png", dpi=2 * fig.dpi)
+    saved = plt.imread(tmp_path / "plot.png")[..., :3].mean(axis=2)
+    (left, bottom), (right, top) = 2 * ax.transData.transform([(-0.5, 1.5), (0.5, 0.5)])
+    height = saved.shape[0]
+    # inset to keep the axes frame out
+    cell = saved[
+        height - int(top) + 3 : height - int(bottom) - 3,
+        int(left) + 3 : int(right) - 3,
+    ]
+    shade = (cell - cell.min()) / (np.median(cell) - cell.min())
+    blurred = ((shade > 0.2) & (shade < 0.8)).sum()
+    assert blurred < (shade < 0.5).sum()
+    plt.close(fig)
+
+
 def test_plot_alignments_with_pdf(tmp_path):
     """Test plotting with PDF output"""
     output_path = tmp_path / "test_plot.pdf"
@@ -353,3 +562,189 @@ def test_auto_alignment_maintains_compatibility():
     assert auto_aln.mutation_ct == manual_aln.mutation_ct
     assert auto_aln.insertion_ct == manual_aln.insertion_ct
     assert auto_aln.deletion_ct == manual_aln.deletion_ct
+
+
+def _affine_score(target_aligned, query_aligned, open_gap, extend_gap):
+    score = 0.0
+    prev = None
+    for target_base, query_base in zip(target_aligned, query_aligned):
+        if target_base == "-":
+            score += extend_gap if prev == "I" else open_gap
+            prev = "I"
+        elif query_base == "-":
+            score += extend_gap if prev == "D" else open_gap
+            prev = "D"
+        else:
+            score += target_base == query_base
+            prev = None
+    return score
+
+
+def test_nw_align_matches_biopython_score():
+    """Test that the numba aligner finds an optimal global alignment"""
+    pytest.importorskip("numba")
+    from pyigv._nw import nw_align
+    from pyigv.alignment import OPEN_GAP_SCORE, EXTEND_GAP_SCORE, get_default_aligner
+
+    aligner = get_default_aligner()
+
+    pairs = [
+        ("AAACCCGGG", "AAATTTGGG"),
+        ("ATCG", "ATCCCG"),
+        ("ATCGATCG", "ATCATCG"),
+        ("AAACCCGGGTTTATATATAT", "AAATTTGGGAAACCCCCCCC"),
+    ]
+    for target, query in pairs:
+        target_aligned, query_aligned = nw_align(
+            target, query, OPEN_GAP_SCORE, EXTEND_GAP_SCORE
+        )
+        assert target_aligned.replace("-", "") == target
+        assert query_aligned.replace("-", "") == query
+        score = _affine_score(
+            target_aligned, query_aligned, OPEN_GAP_SCORE, EXTEND_GAP_SCORE
+        )
+        # tight enough to tell adjacent gaps from split ones (1e-6 apart)
+        assert score == pytest.approx(aligner.score(target, query), abs=1e-9)
+        assert Alignment(target, query).target_alignment == target_aligned
+
+
+def test_nw_align_matches_biopython_alignment():
+    """Test that both backends pick the same alignment among optimal ones"""
+    pytest.importorskip("numba")
+    from pyigv._nw import nw_align
+    from pyigv.alignment import get_default_aligner
+
+    aligner = get_default_aligner()
+
+    # the README examples
+    target = "AAACCCGGGTTTATATATAT"
+    queries = [
+        "AAACCCGGGTTTATATATAT",
+        "AAAGCCGGGTTTATATATAT",
+        "AAACCCGGGTTTTATATAT",
+        "AAACCCGGGTTTATATATATAT",
+        "AAATTTGGGAAACCCCCCCC",
+    ]
+    for query in queries:
+        expected = aligner.align(target, query)[0]
+        aln = Alignment(target, query)
+        assert aln.target_alignment == expected[0]
+        assert aln.query_alignment == expected[1]
+        assert nw_align(target, query) == [expected[0], expected[1]]
+
+
+def test_auto_alignment_keeps_insertions_adjacent():
+    """Test that a 2 bp insertion is not split into two 1 bp ones"""
+    aln = Alignment("AAACCCGGGTTTATATATAT", "AAACCCGGGTTTATATATATAT")
+
+    assert aln.target_alignment == "AAACCCGGGTT--TATATATAT"
+    assert aln.get_insertion_indices() == [[11, 2]]
+
+
+def test_alignment_rejects_non_ascii():
+    """Test that non-ASCII sequences raise a clear error"""
+    with pytest.raises(ValueError, match="only ASCII sequences are supported"):
+        Alignment("ACGT", "ACGé", ["ACGT", "ACGé"])
+    with pytest.raises(ValueError, match="'é' at position 3"):
+        Alignment("ACGT", "ACGé")
+
+
+def test_block_indices():
+    """Test run-length blocks of the edit string"""
+    target = "AAAAAAT"
+    query = "AAAGGAAC"
+    alignment = ["AAA--AAAT", "AAAGG-AAC"]
+
+    aln = Alignment(target, query, alignment)
+
+    assert aln.edits == "   IM  M"
+    assert list(aln.block_indices()) == [
+        (0, 3, " "),
+        (3, 4, "I"),
+        (4, 5, "M"),
+        (5, 7, " "),
+        (7, 8, "M"),
+    ]
+    assert list(aln.block_indices(["I", "I", " "])) == [(0, 2, "I"), (2, 3, " ")]
+    assert list(aln.block_indices("II ")) == [(0, 2, "I"), (2, 3, " ")]
+    codes = np.frombuffer(b"II ", dtype=np.uint8)
+    assert list(aln.block_indices(codes)) == [(0, 2, "I"), (2, 3, " ")]
+    assert list(aln.block_indices([])) == []
+    codes = np.array([73, 73, 32])
+    assert list(aln.block_indices(codes)) == [(0, 2, "I"), (2, 3, " ")]
+    with pytest.raises(ValueError, match="between 0 and 255"):
+        list(aln.block_indices(np.array([73, 256])))
+    with pytest.raises(ValueError, match="'II' at position 0"):
+        list(aln.block_indices(["II", " "]))
+    with pytest.raises(ValueError, match="'' at position 1"):
+        list(aln.block_indices(["I", "", " "]))
+
+
+def test_build_alignment_matches_numpy_fallback():
+    """Test that the fused numba construction matches the NumPy fallback"""
+    pytest.importorskip("numba")
+    from pyigv._build import build_alignment
+    from pyigv.alignment import _build_alignment_numpy, to_codes
+
+    pairs = [
+        ("", ""),
+        ("AC-GT-A", "ACTG-CA"),
+        ("AC---GGA", "A-TTT--A"),
+        ("AAA--AAAT", "AAAGG-AAC"),
+        ("A--AC---G", "ATT-CGGA-"),
+        ("ACGT", "AC"),
+    ]
+    for target_aligned, query_aligned in pairs:
+        target_codes = to_codes(target_aligned)
+        query_codes = to_codes(query_aligned)
+        buf, counts, insertions = build_alignment(target_codes, query_codes)
+        expected = _build_alignment_numpy(target_codes, query_codes)
+        assert buf.tobytes() == expected[0].tobytes()
+        assert counts.tolist() == expected[1].tolist()
+        assert insertions.tolist() == expected[2].tolist()
+
+
+def test_default_aligner_is_reused():
+    """Test that the Biopython fallback aligner is built once"""
+    from pyigv.alignment import OPEN_GAP_SCORE, EXTEND_GAP_SCORE, get_default_aligner
+
+    aligner = get_default_aligner()
+
+    assert get_default_aligner() is aligner
+    assert aligner.open_gap_score == OPEN_GAP_SCORE
+    assert aligner.extend_gap_score == EXTEND_GAP_SCORE
+
+
+def test_from_batch_matches_single_alignments():
+    """Test that batch alignment gives the same result as aligning one by one"""
+    target = "AAACCCGGGTTTATATATAT"
+    queries = [
+        "AAACCCGGGTTTATATATAT",
+        "AAAGCCGGGTTTATATATAT",
+        "AAACCCGGGTTTTATATAT",
+        "AAACCCGGGTTTATATATATAT",
+        "AAATTTGGGAAACCCCCCCC",
+    ]
+
+    batch = Alignment.from_batch(target, queries)
+
+    assert len(batch) == len(queries)
+    for aln, query in zip(batch, queries):
+        single = Alignment(target, query)
+        assert aln.query == query
+        assert aln.target_alignment == single.target_alignment
+        assert aln.query_alignment == single.query_alignment
+        assert aln.edits == single.edits
+
+
+def test_import_does_not_load_heavy_dependencies():
+    """Test that importing pyigv defers matplotlib, Biopython and numba"""
+    code = (
+        "import sys, pyigv; "
+        "print(' '.join(m for m in ('matplotlib', 'Bio', 'numba') if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == ""